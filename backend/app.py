@@ -4,8 +4,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from dotenv import load_dotenv
-import json
+import asyncio
+import orjson
 import uuid
+from typing import Dict, Optional
 from game_manager import GameManager
 
 load_dotenv()
@@ -82,9 +84,9 @@ async def get_game(game_id: str):
     
     return {
         "game_id": game_id,
-        "players": {pid: p["name"] for pid, p in game_data["players"].items()},
-        "status": game_data["game"].status.value,
-        "current_player": game_data["current_player"]
+        "players": game_data.player_names,
+        "status": game_data.game.status_str,
+        "current_player": game_data.current_player_id()
     }
 
 
@@ -97,67 +99,130 @@ async def get_game_status(game_id: str):
     
     return {
         "exists": True,
-        "players_count": len(game_data["players"]),
-        "status": game_data["game"].status.value
+        "players_count": game_data.player_count(),
+        "status": game_data.game.status_str
     }
 
 
-# Store active WebSocket connections
-active_connections: dict = {}  # {session_id: websocket}
+# Messages a client may have waiting before it is dropped as too slow
+SEND_QUEUE_SIZE = 64
 
 
-async def broadcast_to_game(game_id: str, message: dict):
-    """Broadcast message to all players in a game."""
-    game_data = game_manager.get_game(game_id)
-    if not game_data:
-        return
+class ClientConnection:
+    """A client socket with its own outgoing queue, drained by a dedicated task.
+    
+    Queueing keeps a slow client from holding up broadcasts to the other player.
+    """
+    
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.drain_task = asyncio.create_task(self._drain())
+        self.drop_task: Optional[asyncio.Task] = None
+    
+    def enqueue(self, payload: str) -> bool:
+        """Queue an encoded message, dropping the client if its queue is full."""
+        try:
+            self.queue.put_nowait(payload)
+            return True
+        except asyncio.QueueFull:
+            if self.drop_task is None:
+                self.drain_task.cancel()
+                self.drop_task = asyncio.create_task(self._drop())
+            return False
+    
+    def close(self):
+        """Stop sending once the connection has ended."""
+        self.drain_task.cancel()
     
-    disconnected_sessions = []
-    for player_id, player_data in game_data["players"].items():
-        session_id = player_data["session_id"]
-        if session_id in active_connections:
+    async def _drain(self):
+        while True:
+            payload = await self.queue.get()
             try:
-                await active_connections[session_id].send_json(message)
-            except:
-                disconnected_sessions.append(session_id)
-        else:
-            disconnected_sessions.append(session_id)
+                await self.websocket.send_text(payload)
+            # What Starlette and uvicorn raise on a closed socket (uvicorn's ClientDisconnected is an OSError)
+            except (WebSocketDisconnect, RuntimeError, OSError):
+                return  # The receive loop notices the disconnect and cleans up
+            except Exception as e:
+                print(f"WebSocket send error: {e}")
+                return
     
-    # Clean up disconnected sessions
-    for session_id in disconnected_sessions:
-        game_manager.disconnect_player(session_id)
-        if session_id in active_connections:
-            del active_connections[session_id]
+    async def _drop(self):
+        # Closing ends the receive loop, which runs the usual disconnect handling
+        try:
+            await self.websocket.close(code=1013)
+        except (WebSocketDisconnect, RuntimeError, OSError):
+            pass  # Already closed
+        except Exception as e:
+            print(f"WebSocket close error: {e}")
+
+
+# Store active connections per game
+game_connections: Dict[str, Dict[int, ClientConnection]] = {}  # {game_id: {session_id: connection}}
+
+
+def remove_connection(game_id: str, session_id: int):
+    """Forget a session's connection, dropping the game's entry once it is empty."""
+    connections = game_connections.get(game_id)
+    if connections is None:
+        return
+    connections.pop(session_id, None)
+    if not connections:
+        del game_connections[game_id]
+
 
+def encode_message(message: dict) -> str:
+    """Encode a message to JSON text once so it can be sent to several sockets."""
+    return orjson.dumps(message).decode()
 
-async def notify_other_players(game_id: str, exclude_session: str, message: dict):
+
+def send(connection: ClientConnection, message: dict):
+    """Queue a message for a single client."""
+    connection.enqueue(encode_message(message))
+
+
+def broadcast_to_game(game_id: str, message: dict):
+    """Broadcast message to all players in a game."""
+    connections = game_connections.get(game_id)
+    if not connections:
+        return
+    
+    payload = encode_message(message)
+    dropped_sessions = {
+        session_id for session_id, connection in connections.items()
+        if not connection.enqueue(payload)
+    }
+    if dropped_sessions:
+        game_manager.disconnect_many(dropped_sessions)
+        for session_id in dropped_sessions:
+            remove_connection(game_id, session_id)
+
+
+def notify_other_players(game_id: str, exclude_session: int, message: dict):
     """Notify all players except the excluded session."""
-    game_data = game_manager.get_game(game_id)
-    if not game_data:
+    connections = game_connections.get(game_id)
+    if not connections:
         return
     
-    for player_id, player_data in game_data["players"].items():
-        session_id = player_data["session_id"]
-        if session_id != exclude_session and session_id in active_connections:
-            try:
-                await active_connections[session_id].send_json(message)
-            except:
-                pass
+    payload = encode_message(message)
+    for session_id, connection in connections.items():
+        if session_id != exclude_session:
+            connection.enqueue(payload)
 
 
 # Store WebSocket connections
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    session_id = str(uuid.uuid4())
-    active_connections[session_id] = websocket
+    connection = ClientConnection(websocket)
+    session_id = uuid.uuid4().int  # Server-side only, int keys hash cheaper than uuid strings
     game_id = None
     player_id = None
     
     try:
         while True:
             data = await websocket.receive_text()
-            message = json.loads(data)
+            message = orjson.loads(data)
             msg_type = message.get("type")
             
             if msg_type == "join":
@@ -165,7 +230,7 @@ async def websocket_endpoint(websocket: WebSocket):
                 player_name = message.get("playerName")
                 
                 if not game_id:
-                    await websocket.send_json({
+                    send(connection, {
                         "type": "error",
                         "message": "Game ID required"
                     })
@@ -174,17 +239,18 @@ async def websocket_endpoint(websocket: WebSocket):
                 result = game_manager.join_game(game_id, session_id, player_name)
                 
                 if "error" in result:
-                    await websocket.send_json({
+                    send(connection, {
                         "type": "error",
                         "message": result["error"]
                     })
                     continue
                 
                 player_id = result["player_id"]
-                game_data = game_manager.get_game(game_id)
+                game_connections.setdefault(game_id, {})[session_id] = connection
                 
+                # The same state goes to the joining player and the others
                 game_state = game_manager.get_game_state(game_id)
-                await websocket.send_json({
+                send(connection, {
                     "type": "joined",
                     "player_id": player_id,
                     "game_id": game_id,
@@ -192,8 +258,7 @@ async def websocket_endpoint(websocket: WebSocket):
                     "game_state": game_state
                 })
                 
-                game_state = game_manager.get_game_state(game_id)
-                await notify_other_players(game_id, session_id, {
+                notify_other_players(game_id, session_id, {
                     "type": "player_joined",
                     "player_id": player_id,
                     "player_name": result["players"][player_id],
@@ -203,7 +268,7 @@ async def websocket_endpoint(websocket: WebSocket):
             
             elif msg_type == "reveal" or msg_type == "flag":
                 if not game_id or not player_id:
-                    await websocket.send_json({
+                    send(connection, {
                         "type": "error",
                         "message": "Not in a game"
                     })
@@ -213,7 +278,7 @@ async def websocket_endpoint(websocket: WebSocket):
                 col = message.get("col")
                 
                 if row is None or col is None:
-                    await websocket.send_json({
+                    send(connection, {
                         "type": "error",
                         "message": "Row and col required"
                     })
@@ -222,15 +287,13 @@ async def websocket_endpoint(websocket: WebSocket):
                 result = game_manager.make_move(game_id, session_id, msg_type, row, col)
                 
                 if "error" in result:
-                    await websocket.send_json({
+                    send(connection, {
                         "type": "error",
                         "message": result["error"]
                     })
                     continue
                 
-                # Get full game state with proper structure
-                full_game_state = game_manager.get_game_state(game_id)
-                
+                # Only the cells touched by this move are sent, clients patch their board
                 broadcast_message = {
                     "type": "action_result",
                     "action": msg_type,
@@ -239,37 +302,38 @@ async def websocket_endpoint(websocket: WebSocket):
                     "result": result["result"],
                     "current_player": result["current_player"],
                     "player_id": player_id,  # Include which player made the move
-                    "game_state": full_game_state,
-                    "player_stats": result.get("player_stats", {})
+                    "delta": result["delta"],
+                    "player_stats": result["player_stats"]
                 }
                 
-                await broadcast_to_game(game_id, broadcast_message)
+                broadcast_to_game(game_id, broadcast_message)
                 
                 # Only send game_over if it's actually game over (not just a mine hit in survival mode)
                 if result["result"].get("game_over"):
                     game_over_msg = {
                         "type": "game_over",
                         "won": result["result"].get("won", False),
-                        "reason": result["result"].get("result", "unknown")
+                        "reason": result["result"].get("result", "unknown"),
+                        "game_state": game_manager.get_game_state(game_id)  # Full state reveals the mines
                     }
-                    await broadcast_to_game(game_id, game_over_msg)
+                    broadcast_to_game(game_id, game_over_msg)
             
             elif msg_type == "get_state":
                 if not game_id:
-                    await websocket.send_json({
+                    send(connection, {
                         "type": "error",
                         "message": "Not in a game"
                     })
                     continue
                 
                 game_state = game_manager.get_game_state(game_id)
-                await websocket.send_json({
+                send(connection, {
                     "type": "game_state",
                     "game_state": game_state
                 })
             
             else:
-                await websocket.send_json({
+                send(connection, {
                     "type": "error",
                     "message": f"Unknown message type: {msg_type}"
                 })
@@ -277,18 +341,18 @@ async def websocket_endpoint(websocket: WebSocket):
     except WebSocketDisconnect:
         if game_id:
             game_manager.disconnect_player(session_id)
-            await notify_other_players(game_id, session_id, {
+            notify_other_players(game_id, session_id, {
                 "type": "player_disconnected",
                 "player_id": player_id
             })
-        if session_id in active_connections:
-            del active_connections[session_id]
+            remove_connection(game_id, session_id)
     except Exception as e:
         print(f"WebSocket error: {e}")
         if game_id:
             game_manager.disconnect_player(session_id)
-        if session_id in active_connections:
-            del active_connections[session_id]
+            remove_connection(game_id, session_id)
+    finally:
+        connection.close()
 
 
 if __name__ == "__main__":
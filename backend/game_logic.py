@@ -1,12 +1,20 @@
-import random
-from typing import List, Tuple, Set, Optional, Dict
+from typing import Callable, List, Tuple, Optional, Dict
 from enum import Enum
 
+import numpy as np
 
-class CellState(Enum):
-    HIDDEN = "hidden"
-    REVEALED = "revealed"
-    FLAGGED = "flagged"
+try:
+    from numba import njit
+except ImportError:  # numba is optional, fall back to the pure Python kernel
+    njit = None
+
+# Integer cell states stored in MinesweeperGame.cell_states
+HIDDEN = 0
+REVEALED = 1
+FLAGGED = 2
+
+# Random source for mine placement
+_rng = np.random.default_rng()
 
 
 class GameStatus(Enum):
@@ -16,81 +24,205 @@ class GameStatus(Enum):
     LOST = "lost"
 
 
+def _flood_fill(board, states, rows, cols, start_r, start_c, revealed):
+    """Reveal cells with a flood fill from a non-mine cell.
+    
+    The flat indices of newly revealed cells are written to the `revealed`
+    buffer (length rows * cols) and their count is returned. Cells are marked
+    revealed when queued, so each one enters the buffer at most once and the
+    buffer doubles as the BFS queue. Only neighbors of empty (0) cells are
+    expanded, and those can never be mines.
+    """
+    start = start_r * cols + start_c
+    if states[start] != HIDDEN:
+        return 0
+    states[start] = REVEALED
+    revealed[0] = start
+    head = 0
+    tail = 1
+    while head < tail:
+        index = revealed[head]
+        head += 1
+        if board[index] != 0:
+            continue
+        r = index // cols
+        c = index - r * cols
+        for nr in range(r - 1, r + 2):
+            if 0 <= nr < rows:
+                base = nr * cols
+                for nc in range(c - 1, c + 2):
+                    if 0 <= nc < cols and states[base + nc] == HIDDEN:
+                        states[base + nc] = REVEALED
+                        revealed[tail] = base + nc
+                        tail += 1
+    return tail
+
+
+if njit is not None:
+    _flood_fill = njit(cache=True)(_flood_fill)
+    # Compile now so the first reveal of a game doesn't pay for it
+    _flood_fill(np.zeros(1, dtype=np.int8), np.zeros(1, dtype=np.uint8), 1, 1, 0, 0, np.zeros(1, dtype=np.int32))
+
+# Board sizes of the difficulty presets, which get a flood fill compiled for their exact dimensions
+SPECIALIZED_BOARD_SIZES = ((9, 9), (16, 16), (16, 30))
+
+# Flood fill kernels taking (board, states, start_r, start_c, revealed), by (rows, cols)
+_flood_kernels: Dict[Tuple[int, int], Callable] = {}
+
+
+def _get_flood_kernel(rows: int, cols: int) -> Callable:
+    """Get the flood fill for a board size, building and caching it on first use.
+    
+    With numba, preset sizes get a kernel where rows and cols are closure
+    constants, letting LLVM fold the bounds checks and index arithmetic. Those
+    are compiled at import below; other sizes share the generic kernel so
+    custom boards don't trigger compiles.
+    """
+    kernel = _flood_kernels.get((rows, cols))
+    if kernel is None:
+        def kernel(board, states, start_r, start_c, revealed):
+            return _flood_fill(board, states, rows, cols, start_r, start_c, revealed)
+        if njit is not None and (rows, cols) in SPECIALIZED_BOARD_SIZES:
+            kernel = njit(kernel)  # Closures can't use the on-disk cache
+        _flood_kernels[(rows, cols)] = kernel
+    return kernel
+
+
+if njit is not None:
+    # Closures can't use the on-disk cache, so compile the preset kernels now rather
+    # than on the event loop during the first reveal of each size
+    for _rows, _cols in SPECIALIZED_BOARD_SIZES:
+        _get_flood_kernel(_rows, _cols)(
+            np.zeros(_rows * _cols, dtype=np.int8), np.zeros(_rows * _cols, dtype=np.uint8),
+            0, 0, np.zeros(_rows * _cols, dtype=np.int32)
+        )
+    del _rows, _cols
+
+
 class MinesweeperGame:
+    __slots__ = (
+        "rows", "cols", "mines", "game_mode", "board", "cell_states", "_reveal_buffer",
+        "_pending_changes", "is_mine", "revealed_count", "flagged_count", "_status", "status_str",
+        "mine_hits", "mine_hit_by_player", "_version", "_cached_serialized",
+        "_cached_version", "_reveal_impl", "_delta_version",
+    )
+    
     def __init__(self, rows: int = 16, cols: int = 16, mines: int = 40, game_mode: str = "classic"):
         self.rows = rows
         self.cols = cols
         self.mines = mines
         self.game_mode = game_mode
-        self.board = [[0 for _ in range(cols)] for _ in range(rows)]
-        self.cell_states = [[CellState.HIDDEN for _ in range(cols)] for _ in range(rows)]
-        self.mine_positions: Set[Tuple[int, int]] = set()
+        # Flat row-major buffers, cell (r, c) lives at index r * cols + c
+        self.board = np.zeros(rows * cols, dtype=np.int8)
+        self.cell_states = np.zeros(rows * cols, dtype=np.uint8)
+        self._reveal_buffer = np.empty(rows * cols, dtype=np.int32)  # Scratch output for _flood_fill
+        self._pending_changes: List[int] = []  # Flat indices changed since the last get_delta_state
+        # Mine lookup for callers: is_mine[row * cols + col] is an O(1) test, never scan mine lists
+        self.is_mine = np.zeros(rows * cols, dtype=np.bool_)
         self.revealed_count = 0
         self.flagged_count = 0
-        self.status = GameStatus.WAITING
-        self.first_click = True
-        self.mine_hits: Set[Tuple[int, int]] = set()  # Track which mines have been hit
-        self.mine_hit_by_player: Dict[Tuple[int, int], str] = {}  # Track which player hit which mine
+        self._status = GameStatus.WAITING
+        self.status_str = GameStatus.WAITING.value  # Kept in sync by the status setter
+        # Plain function, not a bound method, so the game doesn't reference itself; swapped
+        # for _reveal_normal once mines are placed
+        self._reveal_impl = MinesweeperGame._reveal_first
+        self.mine_hits = np.zeros(rows * cols, dtype=np.bool_)  # Track which mines have been hit
+        self.mine_hit_by_player: Dict[int, str] = {}  # Track which player hit which mine, by flat index
+        self._version = 0  # Bumped on every change to the serialized state
+        self._delta_version = 0  # Version the next delta applies on top of
+        self._cached_serialized: Optional[dict] = None
+        self._cached_version = -1
+    
+    @property
+    def first_click(self) -> bool:
+        """Whether mines are still unplaced, derived from the reveal implementation in use."""
+        return self._reveal_impl is MinesweeperGame._reveal_first
+    
+    # Reads inside the class use _status directly; the setter keeps the caches in step
+    @property
+    def status(self) -> GameStatus:
+        return self._status
+    
+    @status.setter
+    def status(self, status: GameStatus):
+        self._status = status
+        self.status_str = status.value
+        self._version += 1
         
     def place_mines(self, exclude_row: int, exclude_col: int):
         """Place mines randomly, excluding the first clicked cell and its neighbors."""
-        exclude_positions = set()
-        exclude_positions.add((exclude_row, exclude_col))
-        # Exclude neighbors of first click
-        for dr in [-1, 0, 1]:
-            for dc in [-1, 0, 1]:
-                nr, nc = exclude_row + dr, exclude_col + dc
-                if 0 <= nr < self.rows and 0 <= nc < self.cols:
-                    exclude_positions.add((nr, nc))
-        
-        available_positions = [
-            (r, c) for r in range(self.rows) for c in range(self.cols)
-            if (r, c) not in exclude_positions
-        ]
-        
-        mine_positions = random.sample(available_positions, min(self.mines, len(available_positions)))
-        self.mine_positions = set(mine_positions)
-        
-        # Update board with mine counts
-        for r, c in self.mine_positions:
-            self.board[r][c] = -1  # -1 represents a mine
-        
-        # Calculate numbers for each cell
-        for r in range(self.rows):
-            for c in range(self.cols):
-                if self.board[r][c] != -1:
-                    count = sum(
-                        1 for dr in [-1, 0, 1] for dc in [-1, 0, 1]
-                        if (r + dr, c + dc) in self.mine_positions
-                    )
-                    self.board[r][c] = count
+        rows, cols = self.rows, self.cols
+        
+        # Exclude the first click and its neighbors, then sample mine indices from the rest
+        excluded = np.zeros((rows, cols), dtype=np.bool_)
+        excluded[max(exclude_row - 1, 0):exclude_row + 2, max(exclude_col - 1, 0):exclude_col + 2] = True
+        candidates = np.flatnonzero(~excluded.ravel())
+        chosen = _rng.choice(candidates, size=min(self.mines, len(candidates)), replace=False)
+        
+        self.is_mine[chosen] = True
+        mask = self.is_mine.reshape(rows, cols).astype(np.int8)
+        
+        # Count neighboring mines by summing the eight shifted views of the padded mask
+        padded = np.pad(mask, 1)
+        counts = np.zeros((rows, cols), dtype=np.int8)
+        for dr in (0, 1, 2):
+            for dc in (0, 1, 2):
+                if dr != 1 or dc != 1:
+                    counts += padded[dr:dr + rows, dc:dc + cols]
+        
+        # -1 represents a mine
+        self.board[:] = np.where(mask == 1, -1, counts).ravel()
     
     def reveal_cell(self, row: int, col: int, player_id: str = None) -> dict:
         """Reveal a cell and return the result."""
+        return self._reveal_impl(self, row, col, player_id)
+    
+    def _reveal_first(self, row: int, col: int, player_id: Optional[str]) -> dict:
+        """Handle the first reveal: place mines around it, then switch to _reveal_normal."""
+        error = self._reveal_error(row, col)
+        if error:
+            return error
+        
+        self.place_mines(row, col)
+        self.status = GameStatus.PLAYING
+        self._reveal_impl = MinesweeperGame._reveal_normal
+        return self._reveal_valid_cell(row, col, player_id)
+    
+    def _reveal_normal(self, row: int, col: int, player_id: Optional[str]) -> dict:
+        error = self._reveal_error(row, col)
+        if error:
+            return error
+        return self._reveal_valid_cell(row, col, player_id)
+    
+    def _reveal_error(self, row: int, col: int) -> Optional[dict]:
+        """Return an error result if the cell can't be revealed, otherwise None."""
         if not (0 <= row < self.rows and 0 <= col < self.cols):
             return {"error": "Invalid cell coordinates"}
         
-        if self.cell_states[row][col] == CellState.REVEALED:
+        state = self.cell_states[row * self.cols + col]
+        if state == REVEALED:
             return {"error": "Cell already revealed"}
         
-        if self.cell_states[row][col] == CellState.FLAGGED:
+        if state == FLAGGED:
             return {"error": "Cannot reveal flagged cell"}
         
-        if self.status != GameStatus.PLAYING and self.status != GameStatus.WAITING:
+        if self._status != GameStatus.PLAYING and self._status != GameStatus.WAITING:
             return {"error": "Game is not in play"}
         
-        # Place mines on first click
-        if self.first_click:
-            self.place_mines(row, col)
-            self.status = GameStatus.PLAYING
-            self.first_click = False
+        return None
+    
+    def _reveal_valid_cell(self, row: int, col: int, player_id: Optional[str]) -> dict:
+        """Reveal a cell that passed _reveal_error, once mines are placed."""
+        index = row * self.cols + col
+        self._version += 1
         
         # Check if it's a mine
-        if (row, col) in self.mine_positions:
-            self.cell_states[row][col] = CellState.REVEALED
-            self.mine_hits.add((row, col))
+        if self.is_mine[index]:
+            self.cell_states[index] = REVEALED
+            self._pending_changes.append(index)
+            self.mine_hits[index] = True
             if player_id:
-                self.mine_hit_by_player[(row, col)] = player_id
+                self.mine_hit_by_player[index] = player_id
             
             # In survival mode, don't end the game, just mark the mine as hit
             if self.game_mode == "survival":
@@ -111,14 +243,11 @@ class MinesweeperGame:
                     "player_id": player_id
                 }
         
-        # Track cells revealed before flood fill
-        cells_revealed_before = self.revealed_count
-        
-        # Reveal cell and flood fill if empty
-        self._reveal_cell_recursive(row, col)
-        
-        # Calculate how many cells were revealed (including flood fill)
-        cells_revealed_count = self.revealed_count - cells_revealed_before
+        # Reveal cell and flood fill if empty, counting every cell revealed
+        flood_fill = _get_flood_kernel(self.rows, self.cols)
+        cells_revealed_count = flood_fill(self.board, self.cell_states, row, col, self._reveal_buffer)
+        self.revealed_count += cells_revealed_count
+        self._pending_changes.extend(self._reveal_buffer[:cells_revealed_count].tolist())
         
         # Check win condition
         total_cells = self.rows * self.cols
@@ -145,83 +274,92 @@ class MinesweeperGame:
         
         return {
             "result": "number",
-            "value": self.board[row][col],
+            "value": int(self.board[index]),
             "game_over": False,
             "cells_revealed": cells_revealed_count
         }
     
-    def _reveal_cell_recursive(self, row: int, col: int):
-        """Recursively reveal cells using flood fill algorithm."""
-        if not (0 <= row < self.rows and 0 <= col < self.cols):
-            return
-        
-        if self.cell_states[row][col] == CellState.REVEALED:
-            return
-        
-        if self.cell_states[row][col] == CellState.FLAGGED:
-            return
-        
-        if (row, col) in self.mine_positions:
-            return
-        
-        self.cell_states[row][col] = CellState.REVEALED
-        self.revealed_count += 1
-        
-        # If cell is empty (0), reveal neighbors
-        if self.board[row][col] == 0:
-            for dr in [-1, 0, 1]:
-                for dc in [-1, 0, 1]:
-                    if dr == 0 and dc == 0:
-                        continue
-                    self._reveal_cell_recursive(row + dr, col + dc)
-    
     def toggle_flag(self, row: int, col: int) -> dict:
         """Toggle flag on a cell."""
         if not (0 <= row < self.rows and 0 <= col < self.cols):
             return {"error": "Invalid cell coordinates"}
         
-        if self.cell_states[row][col] == CellState.REVEALED:
+        index = row * self.cols + col
+        state = self.cell_states[index]
+        if state == REVEALED:
             return {"error": "Cannot flag revealed cell"}
         
-        if self.status != GameStatus.PLAYING and self.status != GameStatus.WAITING:
+        if self._status != GameStatus.PLAYING and self._status != GameStatus.WAITING:
             return {"error": "Game is not in play"}
         
-        if self.cell_states[row][col] == CellState.FLAGGED:
-            self.cell_states[row][col] = CellState.HIDDEN
+        self._version += 1
+        if state == FLAGGED:
+            self.cell_states[index] = HIDDEN
             self.flagged_count -= 1
+            self._pending_changes.append(index)
             return {"result": "unflagged"}
         else:
-            self.cell_states[row][col] = CellState.FLAGGED
+            self.cell_states[index] = FLAGGED
             self.flagged_count += 1
+            self._pending_changes.append(index)
             return {"result": "flagged"}
     
-    def get_serialized_state(self, hide_mines: bool = True) -> dict:
-        """Get serialized game state for client."""
-        board_state = []
-        for r in range(self.rows):
-            row = []
-            for c in range(self.cols):
-                cell = {
-                    "state": self.cell_states[r][c].value,
-                    "value": self.board[r][c]
-                }
-                # Hide mine positions unless game is over
-                if hide_mines and self.status == GameStatus.PLAYING:
-                    if (r, c) in self.mine_positions:
-                        cell["value"] = 0  # Hide mine value
-                row.append(cell)
-            board_state.append(row)
+    def get_delta_state(self) -> dict:
+        """Get the cells changed since the last call, plus counts and status, for client patching.
         
+        Cells are (row, col, state, value) with integer states; value is only
+        meaningful for revealed cells and is 0 otherwise. base_version is the
+        state version the delta applies on top of, so a client holding an older
+        version knows it missed an update and should refetch the full state.
+        """
+        base_version = self._delta_version
+        self._delta_version = self._version
+        indices = np.array(self._pending_changes, dtype=np.intp)
+        self._pending_changes = []
+        states = self.cell_states[indices]
+        values = np.where(states == REVEALED, self.board[indices], 0)
+        change_rows, change_cols = np.divmod(indices, self.cols)
         return {
+            "cells": list(zip(change_rows.tolist(), change_cols.tolist(), states.tolist(), values.tolist())),
+            "flagged_count": self.flagged_count,
+            "revealed_count": self.revealed_count,
+            "status": self.status_str,
+            "base_version": base_version,
+            "version": self._version
+        }
+    
+    def get_serialized_state(self, hide_mines: bool = True) -> dict:
+        """Get serialized game state for client, reusing the last one until the game changes."""
+        if hide_mines and self._cached_version == self._version:
+            return self._cached_serialized
+        
+        cols = self.cols
+        mine_indices = np.flatnonzero(self.is_mine).tolist()
+        
+        # The board is sent as two flat row-major columns: one state digit per cell
+        # ("0" hidden, "1" revealed, "2" flagged) and a list of values. Only revealed
+        # cells carry their board value, so unrevealed mines stay hidden and revealed
+        # ones (hit in survival mode) show as -1.
+        states = self.cell_states
+        cell_states = (states + ord("0")).tobytes().decode("ascii")
+        cell_values = np.where(states == REVEALED, self.board, 0).tolist()
+        
+        serialized = {
             "rows": self.rows,
             "cols": self.cols,
-            "board": board_state,
+            "states": cell_states,
+            "values": cell_values,
             "mines": self.mines,
             "flagged_count": self.flagged_count,
             "revealed_count": self.revealed_count,
-            "status": self.status.value,
-            "mine_positions": list(self.mine_positions) if self.status != GameStatus.PLAYING else [],
-            "mine_hits": list(self.mine_hits) if self.game_mode == "survival" else [],
-            "mine_hit_by_player": {f"{r},{c}": pid for (r, c), pid in self.mine_hit_by_player.items()}
+            "status": self.status_str,
+            "version": self._version,
+            # Hide mine positions unless game is over
+            "mine_positions": [divmod(index, cols) for index in mine_indices] if not hide_mines or self._status != GameStatus.PLAYING else [],
+            "mine_hits": [divmod(index, cols) for index in np.flatnonzero(self.mine_hits).tolist()] if self.game_mode == "survival" else [],
+            "mine_hit_by_player": {"%d,%d" % divmod(index, cols): pid for index, pid in self.mine_hit_by_player.items()}
         }
-
+        if hide_mines:
+            self._cached_serialized = serialized
+            self._cached_version = self._version
+        return serialized
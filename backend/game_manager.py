@@ -1,166 +1,223 @@
+import heapq
 import uuid
 import time
-from typing import Dict, Optional
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
 from game_logic import MinesweeperGame, GameStatus
 
+# Preset board sizes, shared by every create_game call
+_DIFFICULTY_CONFIGS = {
+    "easy": {"rows": 9, "cols": 9, "mines": 10},
+    "medium": {"rows": 16, "cols": 16, "mines": 40},
+    "hard": {"rows": 16, "cols": 30, "mines": 99}
+}
+_DEFAULT_CONFIG = _DIFFICULTY_CONFIGS["medium"]
+
+# Players are slot indices 0/1 internally; these are their ids and default names on the wire
+PLAYER_NAMES = ("player1", "player2")
+_DISPLAY_NAME = ("Player 1", "Player 2")
+
+# Custom difficulty validation errors, returned as-is (callers only serialize them)
+_ERR_CUSTOM_PARAMS = {"error": "Custom difficulty requires rows, cols, and mines parameters"}
+_ERR_ROWS = {"error": "Rows must be between 5 and 50"}
+_ERR_COLS = {"error": "Columns must be between 5 and 50"}
+_ERR_MIN_MINES = {"error": "Mines must be at least 1"}
+_ERR_MAX_MINES = "Too many mines! Maximum is {max_mines} for a {rows}x{cols} board"
+
+
+@dataclass(slots=True)
+class PlayerStats:
+    """Running statistics for one player in a game."""
+    mines_hit: int = 0
+    cells_revealed: int = 0
+    time_played: float = 0
+    mines_flagged: int = 0
+    
+    def to_dict(self) -> dict:
+        return {
+            "mines_hit": self.mines_hit,
+            "cells_revealed": self.cells_revealed,
+            "time_played": self.time_played,
+            "mines_flagged": self.mines_flagged
+        }
+
+
+@dataclass(slots=True)
+class GameRecord:
+    """Server-side bookkeeping for a single game."""
+    game: MinesweeperGame
+    game_mode: str
+    created_at: float
+    last_activity: float
+    players: List[Optional[dict]] = field(default_factory=lambda: [None, None])  # Indexed by player slot
+    current_player: Optional[int] = None
+    stats: List[PlayerStats] = field(default_factory=lambda: [PlayerStats(), PlayerStats()])
+    turn_start: List[Optional[float]] = field(default_factory=lambda: [None, None])  # Track when each player's turn started
+    session_to_player: Dict[int, int] = field(default_factory=dict)  # session_id -> player slot, for O(1) lookups on every move
+    player_names: Dict[str, str] = field(default_factory=dict)  # Wire id -> display name, rebuilt on join/disconnect
+    state_version: int = 0  # Bumped on every mutation that changes get_game_state output
+    cached_state: Optional[dict] = None
+    cached_state_version: int = -1
+    
+    def player_count(self) -> int:
+        return (self.players[0] is not None) + (self.players[1] is not None)
+    
+    def refresh_player_names(self):
+        # Replace rather than mutate, so dicts already handed out stay unchanged
+        self.player_names = {PLAYER_NAMES[idx]: p["name"] for idx, p in enumerate(self.players) if p is not None}
+    
+    def current_player_id(self) -> Optional[str]:
+        return None if self.current_player is None else PLAYER_NAMES[self.current_player]
+    
+    def player_stats(self) -> dict:
+        return {PLAYER_NAMES[0]: self.stats[0].to_dict(), PLAYER_NAMES[1]: self.stats[1].to_dict()}
+
 
 class GameManager:
     def __init__(self):
-        self.games: Dict[str, dict] = {}
-        self.player_sessions: Dict[str, str] = {}  # session_id -> game_id
+        self.games: Dict[str, GameRecord] = {}
+        self.player_sessions: Dict[int, str] = {}  # session_id (uuid4 as int) -> game_id
         self.game_timeout = 3600  # 1 hour in seconds
+        # (last_activity, game_id) entries; stale ones are skipped when popped
+        self._expiry_heap: List[Tuple[float, str]] = []
     
     def create_game(self, difficulty: str = "medium", game_mode: str = "classic", rows: int = None, cols: int = None, mines: int = None) -> dict:
         """Create a new game and return game info."""
-        game_id = str(uuid.uuid4())[:8]  # Short 8-character ID
+        game_id = uuid.uuid4().hex[:8]  # Short 8-character ID
+        while game_id in self.games:
+            game_id = uuid.uuid4().hex[:8]
         
         # Set difficulty parameters
         if difficulty == "custom":
             # Validate custom parameters
             if rows is None or cols is None or mines is None:
-                return {"error": "Custom difficulty requires rows, cols, and mines parameters"}
-            if rows < 5 or rows > 50:
-                return {"error": "Rows must be between 5 and 50"}
-            if cols < 5 or cols > 50:
-                return {"error": "Columns must be between 5 and 50"}
+                return _ERR_CUSTOM_PARAMS
+            if not 5 <= rows <= 50:
+                return _ERR_ROWS
+            if not 5 <= cols <= 50:
+                return _ERR_COLS
             if mines < 1:
-                return {"error": "Mines must be at least 1"}
+                return _ERR_MIN_MINES
             max_mines = rows * cols - 9  # Leave at least 9 cells safe
             if mines > max_mines:
-                return {"error": f"Too many mines! Maximum is {max_mines} for a {rows}x{cols} board"}
+                return {"error": _ERR_MAX_MINES.format(max_mines=max_mines, rows=rows, cols=cols)}
             
             config = {"rows": rows, "cols": cols, "mines": mines}
         else:
-            difficulty_configs = {
-                "easy": {"rows": 9, "cols": 9, "mines": 10},
-                "medium": {"rows": 16, "cols": 16, "mines": 40},
-                "hard": {"rows": 16, "cols": 30, "mines": 99}
-            }
-            config = difficulty_configs.get(difficulty, difficulty_configs["medium"])
+            config = _DIFFICULTY_CONFIGS.get(difficulty, _DEFAULT_CONFIG)
         
         game = MinesweeperGame(**config, game_mode=game_mode)
+        now = time.time()
         
-        self.games[game_id] = {
-            "game": game,
-            "players": {},
-            "current_player": None,
-            "created_at": time.time(),
-            "last_activity": time.time(),
-            "game_mode": game_mode,
-            "player_stats": {
-                "player1": {"mines_hit": 0, "cells_revealed": 0, "time_played": 0, "mines_flagged": 0},
-                "player2": {"mines_hit": 0, "cells_revealed": 0, "time_played": 0, "mines_flagged": 0}
-            },
-            "player_turn_start": {}  # Track when each player's turn started
-        }
+        self.games[game_id] = GameRecord(game=game, game_mode=game_mode, created_at=now, last_activity=now)
+        heapq.heappush(self._expiry_heap, (now, game_id))
         
         return {
             "game_id": game_id,
             "difficulty": difficulty,
             "game_mode": game_mode,
-            "config": config
+            "config": dict(config)  # Copy so callers can't mutate the shared presets
         }
     
-    def join_game(self, game_id: str, session_id: str, player_name: str = None) -> dict:
+    def join_game(self, game_id: str, session_id: int, player_name: str = None) -> dict:
         """Join a game as a player."""
-        if game_id not in self.games:
+        game_data = self.games.get(game_id)
+        if game_data is None:
             return {"error": "Game not found"}
         
-        game_data = self.games[game_id]
-        
-        if len(game_data["players"]) >= 2:
+        players = game_data.players
+        if players[0] is not None and players[1] is not None:
             return {"error": "Game is full"}
         
-        # Assign player number
-        if "player1" not in game_data["players"]:
-            player_id = "player1"
-        else:
-            player_id = "player2"
+        # Assign player slot
+        idx = 0 if players[0] is None else 1
         
-        game_data["players"][player_id] = {
+        players[idx] = {
             "session_id": session_id,
-            "name": player_name or f"Player {player_id[-1]}",
+            "name": player_name or _DISPLAY_NAME[idx],
             "joined_at": time.time()
         }
         
+        game_data.session_to_player[session_id] = idx
+        game_data.refresh_player_names()
         self.player_sessions[session_id] = game_id
         
         # Set first player as current if this is the first player
-        if game_data["current_player"] is None:
-            game_data["current_player"] = "player1"
+        if game_data.current_player is None:
+            game_data.current_player = 0
         
         # Start game if both players joined
-        if len(game_data["players"]) == 2:
-            game_data["game"].status = GameStatus.WAITING
+        if game_data.player_count() == 2:
+            game_data.game.status = GameStatus.WAITING
         
-        game_data["last_activity"] = time.time()
+        game_data.state_version += 1
+        self._touch(game_id, game_data, time.time())
         
         return {
-            "player_id": player_id,
+            "player_id": PLAYER_NAMES[idx],
             "game_id": game_id,
-            "players": {pid: p["name"] for pid, p in game_data["players"].items()}
+            "players": game_data.player_names
         }
     
-    def get_game(self, game_id: str) -> Optional[dict]:
+    def get_game(self, game_id: str) -> Optional[GameRecord]:
         """Get game data."""
-        if game_id not in self.games:
-            return None
-        return self.games[game_id]
+        return self.games.get(game_id)
     
-    def get_player_game(self, session_id: str) -> Optional[tuple]:
+    def get_player_game(self, session_id: int) -> Optional[tuple]:
         """Get game_id and player_id for a session."""
         game_id = self.player_sessions.get(session_id)
-        if not game_id:
+        if game_id is None:
             return None
         
         game_data = self.games.get(game_id)
-        if not game_data:
+        if game_data is None:
             return None
         
-        for player_id, player_data in game_data["players"].items():
-            if player_data["session_id"] == session_id:
-                return (game_id, player_id)
+        idx = game_data.session_to_player.get(session_id)
+        if idx is None:
+            return None
         
-        return None
+        return (game_id, PLAYER_NAMES[idx])
     
-    def make_move(self, game_id: str, session_id: str, action: str, row: int, col: int) -> dict:
+    def make_move(self, game_id: str, session_id: int, action: str, row: int, col: int) -> dict:
         """Make a move in the game."""
-        if game_id not in self.games:
+        game_data = self.games.get(game_id)
+        if game_data is None:
             return {"error": "Game not found"}
         
-        game_data = self.games[game_id]
-        game = game_data["game"]
+        game = game_data.game
         
         # Find player
-        player_id = None
-        for pid, player_data in game_data["players"].items():
-            if player_data["session_id"] == session_id:
-                player_id = pid
-                break
+        idx = game_data.session_to_player.get(session_id)
         
-        if not player_id:
+        if idx is None:
             return {"error": "Player not in game"}
         
         # Check if it's player's turn
-        if game_data["current_player"] != player_id:
+        if game_data.current_player != idx:
             return {"error": "Not your turn"}
         
+        # Bind the per-move lookups once
+        now = time.time()
+        stats = game_data.stats[idx]
+        turn_start = game_data.turn_start
+        
         # Track turn start time for time tracking
-        current_time = time.time()
-        if player_id not in game_data["player_turn_start"]:
-            game_data["player_turn_start"][player_id] = current_time
+        start = turn_start[idx]
+        if start is None:
+            start = turn_start[idx] = now
         
         # Execute action
         if action == "reveal":
-            result = game.reveal_cell(row, col, player_id)
+            result = game.reveal_cell(row, col, PLAYER_NAMES[idx])
         elif action == "flag":
             result = game.toggle_flag(row, col)
-            # Track flagged mines (only if it's actually a mine)
-            if "error" not in result and (row, col) in game.mine_positions:
+            # Track flagged mines (only if it's actually a mine, via the O(1) is_mine mask)
+            if "error" not in result and game.is_mine[row * game.cols + col]:
                 if result.get("result") == "flagged":
-                    game_data["player_stats"][player_id]["mines_flagged"] += 1
+                    stats.mines_flagged += 1
                 elif result.get("result") == "unflagged":
-                    game_data["player_stats"][player_id]["mines_flagged"] = max(0, game_data["player_stats"][player_id]["mines_flagged"] - 1)
+                    stats.mines_flagged = max(0, stats.mines_flagged - 1)
         else:
             return {"error": "Invalid action"}
         
@@ -171,103 +228,115 @@ class GameManager:
         if action == "reveal":
             if result.get("mine_hit"):
                 # Player hit a mine
-                game_data["player_stats"][player_id]["mines_hit"] += 1
+                stats.mines_hit += 1
             else:
                 # Player revealed safe cells (including flood-filled cells)
-                cells_revealed = result.get("cells_revealed", 1)
-                game_data["player_stats"][player_id]["cells_revealed"] += cells_revealed
+                stats.cells_revealed += result.get("cells_revealed", 1)
         
         # Update time played for current player
-        if player_id in game_data["player_turn_start"]:
-            turn_duration = current_time - game_data["player_turn_start"][player_id]
-            game_data["player_stats"][player_id]["time_played"] += turn_duration
+        stats.time_played += now - start
+        
+        # Switch turn logic (flags never pass the turn)
+        if action != "reveal":
+            should_switch = False
+        elif game_data.game_mode == "survival":
+            # In survival mode, only switch turn when mine is hit
+            should_switch = result.get("switch_turn", False)
+        else:
+            # Classic mode: switch turn after each move (unless game over)
+            should_switch = not result.get("game_over", False)
         
-        # Switch turn logic
-        if action == "reveal":
-            game_mode = game_data.get("game_mode", "classic")
-            
-            if game_mode == "survival":
-                # In survival mode, only switch turn when mine is hit
-                if result.get("switch_turn", False):
-                    # Update time for previous player before switching
-                    game_data["player_turn_start"][player_id] = current_time
-                    new_player = "player2" if player_id == "player1" else "player1"
-                    game_data["current_player"] = new_player
-                    game_data["player_turn_start"][new_player] = current_time
-                else:
-                    # Reset turn start time for same player
-                    game_data["player_turn_start"][player_id] = current_time
-            else:
-                # Classic mode: switch turn after each move (unless game over)
-                if not result.get("game_over", False):
-                    game_data["player_turn_start"][player_id] = current_time
-                    new_player = "player2" if player_id == "player1" else "player1"
-                    game_data["current_player"] = new_player
-                    game_data["player_turn_start"][new_player] = current_time
+        next_player = 1 - idx if should_switch else idx
+        game_data.current_player = next_player
+        # Whoever moves next starts their turn clock now, so time is never counted twice
+        turn_start[next_player] = now
         
-        game_data["last_activity"] = time.time()
+        game_data.state_version += 1
+        self._touch(game_id, game_data, now)
         
         return {
             "result": result,
-            "current_player": game_data["current_player"],
-            "game_state": game.get_serialized_state(),
-            "player_stats": game_data["player_stats"]
+            "current_player": PLAYER_NAMES[game_data.current_player],
+            "delta": game.get_delta_state(),
+            "player_stats": game_data.player_stats()
         }
     
     def get_game_state(self, game_id: str) -> Optional[dict]:
-        """Get current game state."""
-        if game_id not in self.games:
+        """Get current game state, reusing the cached copy until the game changes."""
+        game_data = self.games.get(game_id)
+        if game_data is None:
             return None
         
-        game_data = self.games[game_id]
-        return {
-            "game_state": game_data["game"].get_serialized_state(),
-            "current_player": game_data["current_player"],
-            "players": {pid: p["name"] for pid, p in game_data["players"].items()},
-            "status": game_data["game"].status.value,
-            "game_mode": game_data.get("game_mode", "classic"),
-            "player_stats": game_data.get("player_stats", {
-                "player1": {"mines_hit": 0, "cells_revealed": 0, "time_played": 0, "mines_flagged": 0},
-                "player2": {"mines_hit": 0, "cells_revealed": 0, "time_played": 0, "mines_flagged": 0}
-            })
+        if game_data.cached_state_version == game_data.state_version:
+            return game_data.cached_state
+        
+        game_data.cached_state = {
+            "game_state": game_data.game.get_serialized_state(),
+            "current_player": game_data.current_player_id(),
+            "players": game_data.player_names,
+            "status": game_data.game.status_str,
+            "game_mode": game_data.game_mode,
+            "player_stats": game_data.player_stats()
         }
+        game_data.cached_state_version = game_data.state_version
+        return game_data.cached_state
+    
+    def _touch(self, game_id: str, game_data: GameRecord, now: float):
+        """Record activity on a game and schedule its expiry check."""
+        game_data.last_activity = now
+        heap = self._expiry_heap
+        heapq.heappush(heap, (now, game_id))
+        
+        # Every activity pushes a new entry, so drop the stale ones once they dominate
+        if len(heap) > 4 * len(self.games) + 64:
+            self._expiry_heap = [(record.last_activity, gid) for gid, record in self.games.items()]
+            heapq.heapify(self._expiry_heap)
     
-    def disconnect_player(self, session_id: str):
+    def disconnect_player(self, session_id: int):
         """Handle player disconnection."""
-        result = self.get_player_game(session_id)
-        if not result:
+        game_id = self.player_sessions.pop(session_id, None)
+        if game_id is None:
             return
         
-        game_id, player_id = result
-        if game_id not in self.games:
+        game_data = self.games.get(game_id)
+        if game_data is None:
             return
         
-        game_data = self.games[game_id]
-        if player_id in game_data["players"]:
-            del game_data["players"][player_id]
-        
-        if session_id in self.player_sessions:
-            del self.player_sessions[session_id]
+        idx = game_data.session_to_player.pop(session_id, None)
+        if idx is not None and game_data.players[idx] is not None:
+            game_data.players[idx] = None
+            game_data.refresh_player_names()
+            game_data.state_version += 1
         
         # If no players left, mark for cleanup
-        if len(game_data["players"]) == 0:
-            game_data["last_activity"] = 0  # Mark for immediate cleanup
+        if game_data.player_count() == 0:
+            self._touch(game_id, game_data, 0)  # Mark for immediate cleanup
+    
+    def disconnect_many(self, session_ids: Iterable[int]):
+        """Handle disconnection of several players at once."""
+        for session_id in session_ids:
+            self.disconnect_player(session_id)
     
     def cleanup_inactive_games(self):
         """Remove games that have been inactive for too long."""
-        current_time = time.time()
-        games_to_remove = []
-        
-        for game_id, game_data in self.games.items():
-            if current_time - game_data["last_activity"] > self.game_timeout:
-                games_to_remove.append(game_id)
-        
-        for game_id in games_to_remove:
+        heap = self._expiry_heap
+        deadline = time.time() - self.game_timeout
+        
+        # Snapshot the expired ids first, then remove them in one short pass
+        expired = []
+        while heap and heap[0][0] < deadline:
+            last_activity, game_id = heapq.heappop(heap)
+            game_data = self.games.get(game_id)
+            # Skip entries superseded by later activity or already removed games
+            if game_data is not None and game_data.last_activity == last_activity:
+                expired.append(game_id)
+        
+        for game_id in expired:
+            game_data = self.games.pop(game_id, None)
+            if game_data is None:
+                continue  # Listed twice by duplicate heap entries
+            
             # Remove player sessions
-            game_data = self.games[game_id]
-            for player_data in game_data["players"].values():
-                session_id = player_data["session_id"]
-                if session_id in self.player_sessions:
-                    del self.player_sessions[session_id]
-            del self.games[game_id]
+            for session_id in game_data.session_to_player:
+                self.player_sessions.pop(session_id, None)
 
@@ -7,7 +7,9 @@ class GameClient {
         this.playerId = null;
         this.playerName = null;
         this.currentPlayer = null;
+        this.players = null;
         this.gameState = null;
+        this.stateVersion = null;
         this.board = new MinesweeperBoard('game-board');
         this.timer = 0;
         this.timerInterval = null;
@@ -292,12 +294,18 @@ class GameClient {
                 if (message.game_state) {
                     this.updateGameState(message.game_state);
                 }
+                this.players = message.players;
                 this.updatePlayersInfo(message.players);
                 break;
 
             case 'action_result':
                 console.log('Action result received:', message);
                 
+                // Patch the cells this move changed before highlighting the click
+                if (message.delta) {
+                    this.applyActionResult(message);
+                }
+                
                 // If a mine was hit, immediately show the explosion
                 if (message.result && message.result.mine_hit && message.row !== undefined && message.col !== undefined) {
                     const playerId = message.player_id || message.result.player_id;
@@ -309,9 +317,6 @@ class GameClient {
                     }
                 }
                 
-                if (message.game_state) {
-                    this.updateGameState(message.game_state);
-                }
                 if (message.current_player) {
                     this.updateCurrentPlayer(message.current_player);
                 }
@@ -321,6 +326,9 @@ class GameClient {
                 break;
 
             case 'game_over':
+                if (message.game_state) {
+                    this.updateGameState(message.game_state);
+                }
                 this.handleGameOver(message.won, message.reason);
                 break;
 
@@ -347,10 +355,12 @@ class GameClient {
         }
 
         this.gameState = gameState.game_state;
+        this.stateVersion = this.gameState.version;
         this.currentPlayer = gameState.current_player;
+        this.players = gameState.players;
 
         // Update board
-        if (this.gameState.board) {
+        if (this.gameState.states) {
             if (!this.board.board) {
                 this.board.createBoard(this.gameState.rows, this.gameState.cols);
             }
@@ -362,11 +372,36 @@ class GameClient {
             this.board.updateBoard(boardStateWithHits);
         }
 
+        this.refreshGameStatus();
+    }
+
+    applyActionResult(message) {
+        if (!this.gameState) {
+            return;
+        }
+
+        const delta = message.delta;
+        // A delta built on a newer state than ours means we missed one; resync
+        if (this.stateVersion !== null && delta.base_version > this.stateVersion) {
+            this.sendMessage({ type: 'get_state' });
+            return;
+        }
+
+        this.board.applyChanges(delta.cells);
+        this.stateVersion = delta.version;
+        this.gameState.status = delta.status;
+        this.gameState.flagged_count = delta.flagged_count;
+        this.gameState.revealed_count = delta.revealed_count;
+        this.currentPlayer = message.current_player;
+        this.refreshGameStatus();
+    }
+
+    refreshGameStatus() {
         // Update UI
         document.getElementById('mines-count').textContent = this.gameState.mines;
         document.getElementById('flags-count').textContent = this.gameState.flagged_count;
         this.updateCurrentPlayer(this.currentPlayer);
-        this.updatePlayersInfo(gameState.players);
+        this.updatePlayersInfo(this.players);
 
         // Enable/disable board based on turn
         const isMyTurn = this.currentPlayer === this.playerId;
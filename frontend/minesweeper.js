@@ -1,5 +1,8 @@
 // Client-side Minesweeper board rendering and interactions
 
+// Cell state names, indexed by the integer states sent by the server
+const CELL_STATES = ['hidden', 'revealed', 'flagged'];
+
 class MinesweeperBoard {
     constructor(containerId) {
         this.container = document.getElementById(containerId);
@@ -52,74 +55,90 @@ class MinesweeperBoard {
     }
 
     updateBoard(boardState) {
-        if (!this.board || !boardState || !boardState.board) {
+        // The board arrives as flat row-major columns: a string with one state
+        // digit per cell and a matching list of values
+        if (!this.board || !boardState || !boardState.states) {
             return;
         }
 
         for (let r = 0; r < this.rows; r++) {
             for (let c = 0; c < this.cols; c++) {
-                const cell = this.board[r][c];
-                const cellData = boardState.board[r][c];
+                const i = r * this.cols + c;
+                const state = CELL_STATES[boardState.states.charCodeAt(i) - 48];
+                // Check if this mine was hit by a player (for explosion color)
+                const mineKey = `${r},${c}`;
+                const hitByPlayer = boardState.mine_hit_by_player && boardState.mine_hit_by_player[mineKey];
+                this.renderCell(r, c, state, boardState.values[i], hitByPlayer);
+            }
+        }
+    }
 
-                // Reset cell classes but preserve mine explosion styles
-                const isMineExplosion = cell.classList.contains('mine') && cell.textContent === '💥';
-                const preservedStyles = isMineExplosion ? {
-                    borderColor: cell.style.borderColor,
-                    borderWidth: cell.style.borderWidth,
-                    backgroundColor: cell.style.backgroundColor,
-                    opacity: cell.style.opacity
-                } : null;
-                
-                cell.className = 'cell';
-                cell.textContent = '';
-                
-                // Restore preserved styles if it was a mine explosion
-                if (preservedStyles) {
-                    cell.style.borderColor = preservedStyles.borderColor;
-                    cell.style.borderWidth = preservedStyles.borderWidth;
-                    cell.style.backgroundColor = preservedStyles.backgroundColor;
-                    cell.style.opacity = preservedStyles.opacity;
-                }
+    applyChanges(changes) {
+        // Patch only the cells a move touched: [row, col, state, value] entries
+        if (!this.board || !changes) {
+            return;
+        }
 
-                if (cellData.state === 'revealed') {
-                    cell.classList.add('revealed');
-                    const value = cellData.value;
-                    
-                    if (value === -1) {
-                        // Mine - check if we know which player hit it
-                        cell.classList.add('mine');
-                        // Check if this mine was hit by a player (for explosion color)
-                        const mineKey = `${r},${c}`;
-                        const hitByPlayer = boardState.mine_hit_by_player && boardState.mine_hit_by_player[mineKey];
-                        if (hitByPlayer) {
-                            const playerColors = {
-                                'player1': '#3b82f6',
-                                'player2': '#ef4444'
-                            };
-                            const color = playerColors[hitByPlayer] || '#f44336';
-                            cell.style.borderColor = color;
-                            cell.style.borderWidth = '3px';
-                            cell.style.backgroundColor = color;
-                            cell.style.opacity = '0.8';
-                        } else {
-                            // If no player info, use default red
-                            cell.style.borderColor = '#f44336';
-                            cell.style.borderWidth = '3px';
-                            cell.style.backgroundColor = '#f44336';
-                            cell.style.opacity = '0.8';
-                        }
-                        cell.textContent = '💥'; // Explosion emoji
-                    } else if (value > 0) {
-                        // Number
-                        cell.classList.add(`number-${value}`);
-                        cell.textContent = value;
-                    }
-                    // value === 0 means empty, no text
-                } else if (cellData.state === 'flagged') {
-                    cell.classList.add('flagged');
-                    cell.textContent = '🚩';
+        for (const [r, c, state, value] of changes) {
+            this.renderCell(r, c, CELL_STATES[state], value, null);
+        }
+    }
+
+    renderCell(r, c, state, value, hitByPlayer) {
+        const cell = this.board[r][c];
+
+        // Reset cell classes but preserve mine explosion styles
+        const isMineExplosion = cell.classList.contains('mine') && cell.textContent === '💥';
+        const preservedStyles = isMineExplosion ? {
+            borderColor: cell.style.borderColor,
+            borderWidth: cell.style.borderWidth,
+            backgroundColor: cell.style.backgroundColor,
+            opacity: cell.style.opacity
+        } : null;
+        
+        cell.className = 'cell';
+        cell.textContent = '';
+        
+        // Restore preserved styles if it was a mine explosion
+        if (preservedStyles) {
+            cell.style.borderColor = preservedStyles.borderColor;
+            cell.style.borderWidth = preservedStyles.borderWidth;
+            cell.style.backgroundColor = preservedStyles.backgroundColor;
+            cell.style.opacity = preservedStyles.opacity;
+        }
+
+        if (state === 'revealed') {
+            cell.classList.add('revealed');
+            if (value === -1) {
+                // Mine - check if we know which player hit it
+                cell.classList.add('mine');
+                if (hitByPlayer) {
+                    const playerColors = {
+                        'player1': '#3b82f6',
+                        'player2': '#ef4444'
+                    };
+                    const color = playerColors[hitByPlayer] || '#f44336';
+                    cell.style.borderColor = color;
+                    cell.style.borderWidth = '3px';
+                    cell.style.backgroundColor = color;
+                    cell.style.opacity = '0.8';
+                } else {
+                    // If no player info, use default red
+                    cell.style.borderColor = '#f44336';
+                    cell.style.borderWidth = '3px';
+                    cell.style.backgroundColor = '#f44336';
+                    cell.style.opacity = '0.8';
                 }
+                cell.textContent = '💥'; // Explosion emoji
+            } else if (value > 0) {
+                // Number
+                cell.classList.add(`number-${value}`);
+                cell.textContent = value;
             }
+            // value === 0 means empty, no text
+        } else if (state === 'flagged') {
+            cell.classList.add('flagged');
+            cell.textContent = '🚩';
         }
     }
 